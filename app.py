@@ -1,8 +1,24 @@
+import hashlib
 import streamlit as st
 import cv2
 import numpy as np
 import time # Import time for a quick visual delay, if needed, though not strictly necessary
 
+# Numba is optional; without it only the OpenCV kernels are offered. When it
+# is installed the parallel JIT kernels (cached on disk) are used. Otherwise a
+# Canny kernel precompiled by build_canny.py, which does not need Numba at
+# runtime, is used if present.
+try:
+    from canny_numba import ABS_LUT, canny_nb, lut_abs
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    try:
+        from canny_aot import canny as canny_nb
+    except ImportError:
+        canny_nb = None
+NUMBA_CANNY_AVAILABLE = canny_nb is not None
+
 # --- Configuration and Logo/Favicon ---
 # Setting the page config for a better look and feel
 st.set_page_config(
@@ -11,130 +27,364 @@ st.set_page_config(
     layout="wide" # Using wide layout for better side-by-side viewing
 )
 
+# Use the CUDA edge kernels when OpenCV was built with CUDA and a device is present
+CUDA_AVAILABLE = hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+
 # --- 1. Parameter Widgets ---
+# These are rendered inside the sidebar "params" form (see edge_detection_ui),
+# so they use the plain st.* calls of the enclosing form context.
+
+def get_cpu_kernel_param(key, available=NUMBA_AVAILABLE):
+    st.subheader("Implementation")
+    return st.radio("CPU kernel", ("OpenCV", "Numba"), index=0, horizontal=True, key=key, disabled=not available, help="Implementation used on the CPU. Numba must be installed to select it. Selecting Numba also bypasses the CUDA kernels.")
 
 def get_canny_params():
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Gaussian Blur (Pre-filter)")
+    st.markdown("---")
+    st.subheader("Gaussian Blur (Pre-filter)")
     # ADDED UNIQUE KEY
-    sigma = st.sidebar.slider("Sigma (Gaussian Blur)", 0.0, 5.0, 1.0, 0.1, key='canny_sigma', help="Sigma value for the preceding Gaussian filter.") 
+    sigma = st.slider("Sigma (Gaussian Blur)", 0.0, 5.0, 1.0, 0.1, key='canny_sigma', help="Sigma value for the preceding Gaussian filter.") 
     
-    st.sidebar.subheader("Canny Thresholds")
+    st.subheader("Canny Thresholds")
     # ADDED UNIQUE KEYS
-    lower_threshold = st.sidebar.slider("Lower Threshold (minVal)", 0, 255, 50, key='canny_minval', help="Minimum threshold for edge linking.")
-    upper_threshold = st.sidebar.slider("Upper Threshold (maxVal)", 0, 255, 150, key='canny_maxval', help="Maximum threshold for initial edge detection.")
+    lower_threshold = st.slider("Lower Threshold (minVal)", 0, 255, 50, key='canny_minval', help="Minimum threshold for edge linking.")
+    upper_threshold = st.slider("Upper Threshold (maxVal)", 0, 255, 150, key='canny_maxval', help="Maximum threshold for initial edge detection.")
     
-    st.sidebar.subheader("Kernel/Aperture Size")
+    st.subheader("Kernel/Aperture Size")
     # ADDED UNIQUE KEY
-    aperture_size = st.sidebar.selectbox("Kernel Size (Aperture)", (3, 5, 7), index=0, key='canny_aperture', help="Size of the Sobel kernel used for finding image gradients.")
+    aperture_size = st.selectbox("Kernel Size (Aperture)", (3, 5, 7), index=0, key='canny_aperture', help="Size of the Sobel kernel used for finding image gradients.")
+    
+    cpu_kernel = get_cpu_kernel_param('canny_cpu_kernel', NUMBA_CANNY_AVAILABLE)
     
     return {
         'sigma': sigma,
         'minVal': lower_threshold,
         'maxVal': upper_threshold,
-        'aperture_size': aperture_size
+        'aperture_size': aperture_size,
+        'cpu_kernel': cpu_kernel
     }
 
 def get_sobel_params():
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Gradient Direction")
+    st.markdown("---")
+    st.subheader("Gradient Direction")
     # ADDED UNIQUE KEY
-    direction = st.sidebar.selectbox("Gradient Direction", ("X and Y (Combined)", "X only", "Y only"), key='sobel_direction', help="Select the direction(s) for gradient calculation.")
+    direction = st.selectbox("Gradient Direction", ("X and Y (Combined)", "X only", "Y only"), key='sobel_direction', help="Select the direction(s) for gradient calculation.")
     
-    st.sidebar.subheader("Kernel/Aperture Size")
+    st.subheader("Kernel/Aperture Size")
     # ADDED UNIQUE KEY
-    ksize = st.sidebar.selectbox("Kernel Size (ksize)", (3, 5, 7), index=0, key='sobel_ksize', help="Size of the Sobel kernel.")
+    ksize = st.selectbox("Kernel Size (ksize)", (3, 5, 7), index=0, key='sobel_ksize', help="Size of the Sobel kernel.")
+    
+    cpu_kernel = get_cpu_kernel_param('sobel_cpu_kernel')
 
     return {
         'direction': direction,
-        'ksize': ksize
+        'ksize': ksize,
+        'cpu_kernel': cpu_kernel
     }
 
 def get_laplacian_params():
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Kernel/Aperture Size")
+    st.markdown("---")
+    st.subheader("Kernel/Aperture Size")
     # ADDED UNIQUE KEY
-    ksize = st.sidebar.selectbox("Kernel Size (ksize)", (1, 3, 5, 7), index=1, key='laplacian_ksize', help="Size of the Laplacian kernel.") 
+    ksize = st.selectbox("Kernel Size (ksize)", (1, 3, 5, 7), index=1, key='laplacian_ksize', help="Size of the Laplacian kernel.") 
+    
+    cpu_kernel = get_cpu_kernel_param('laplacian_cpu_kernel')
     
     return {
-        'ksize': ksize
+        'ksize': ksize,
+        'cpu_kernel': cpu_kernel
     }
 
 
-# --- 2. Image Processing Logic (No Change) ---
+# --- 2. Image Processing Logic ---
+
+# The grayscale source only depends on the uploaded file, so it is computed
+# once per image key (preview / full resolution) and kept in session state,
+# shared by all algorithms. The dict is cleared when a new image is uploaded.
+def get_gray(image_key, image):
+    gray = st.session_state['gray'].get(image_key)
+    if gray is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        st.session_state['gray'][image_key] = gray
+    return gray
+
+# Blurred variants are cached across slider reruns. The ndarray argument is
+# prefixed with "_" so Streamlit keys on the image's content digest (see
+# content_key) and sigma instead of hashing the whole array on every call.
+@st.cache_data(max_entries=4)
+def blur_gray(image_key, _gray, sigma, ksize_gauss):
+    # Separable Gaussian: the same 1D kernel is applied along rows and columns
+    kernel = get_gaussian_kernel(ksize_gauss, sigma)
+    blurred = get_scratch(_gray.shape, np.uint8, 'blur')
+    return cv2.sepFilter2D(_gray, cv2.CV_8U, kernel, kernel, dst=blurred)
 
-def process_image(image, algorithm, params):
+@st.cache_resource(max_entries=16)
+def get_gaussian_kernel(ksize_gauss, sigma):
+    return cv2.getGaussianKernel(ksize_gauss, sigma, ktype=cv2.CV_32F)
+
+# Intermediate and output buffers are kept in session state per (shape, dtype,
+# role) and passed to OpenCV via dst=, so reruns reuse the same memory instead
+# of allocating fresh arrays. The dict is cleared when a new image is uploaded.
+def get_scratch(shape, dtype, role):
+    scratch = st.session_state['scratch']
+    key = (shape, np.dtype(dtype).str, role)
+    if key not in scratch:
+        scratch[key] = np.empty(shape, dtype)
+    return scratch[key]
+
+# Separable derivative kernels, built once per (ksize, dx, dy) and reused across
+# reruns so cv2.sepFilter2D does not rebuild them on every slider change.
+# Sobel uses 6 combinations and Laplacian 8, hence the bound.
+@st.cache_resource(max_entries=14)
+def get_sobel_kernels(ksize, dx, dy):
+    return cv2.getDerivKernels(dx, dy, ksize, ktype=cv2.CV_32F)
+
+def sobel(gray, ddepth, dx, dy, ksize, dst=None):
+    kx, ky = get_sobel_kernels(ksize, dx, dy)
+    return cv2.sepFilter2D(gray, ddepth, kx, ky, dst=dst)
+
+def abs_u8(grad, params, dst):
+    # |grad| saturated to uint8; the Numba kernel uses a lookup table for CV_16S input
+    if NUMBA_AVAILABLE and params['cpu_kernel'] == "Numba" and grad.dtype == np.int16:
+        return lut_abs(grad, ABS_LUT, dst)
+    return cv2.convertScaleAbs(grad, dst=dst)
+
+# Up to this sigma the smoothing built into Canny's Sobel aperture is enough,
+# so the separate Gaussian pass is skipped and the more accurate L2 gradient
+# magnitude is used instead
+CANNY_PREBLUR_MIN_SIGMA = 1.0
+
+def gaussian_ksize(sigma):
+    ksize_gauss = int(sigma * 4 + 1)
+    if ksize_gauss % 2 == 0: ksize_gauss += 1
+    if ksize_gauss < 3: ksize_gauss = 3
+    return ksize_gauss
+
+def cuda_abs_u8(grad_gpu):
+    # GPU equivalent of cv2.convertScaleAbs for a CV_16S gradient
+    return cv2.cuda.abs(grad_gpu).convertTo(cv2.CV_8U)
+
+def process_image_cuda(gray_gpu, algorithm, params):
+    # Runs the edge kernels on the uploaded GpuMat and only downloads the final
+    # single-channel result. Returns None for settings the CUDA module does not
+    # support, so the caller can fall back to the CPU path.
+    if algorithm == "Canny":
+        sigma = params['sigma']
+        l2_gradient = params['l2_gradient']
+        
+        if not l2_gradient:
+            ksize_gauss = gaussian_ksize(sigma)
+            gauss = cv2.cuda.createGaussianFilter(cv2.CV_8UC1, cv2.CV_8UC1, (ksize_gauss, ksize_gauss), sigma)
+            blurred_gpu = gauss.apply(gray_gpu)
+        else:
+            blurred_gpu = gray_gpu
+
+        detector = cv2.cuda.createCannyEdgeDetector(params['minVal'], params['maxVal'], params['aperture_size'], l2_gradient)
+        return detector.detect(blurred_gpu).download()
+        
+    elif algorithm == "Sobel":
+        ksize = params['ksize']
+        direction = params['direction']
+        
+        sobel_x = cv2.cuda.createSobelFilter(cv2.CV_8UC1, cv2.CV_16S, 1, 0, ksize=ksize)
+        sobel_y = cv2.cuda.createSobelFilter(cv2.CV_8UC1, cv2.CV_16S, 0, 1, ksize=ksize)
+        
+        abs_grad_x = cuda_abs_u8(sobel_x.apply(gray_gpu))
+        abs_grad_y = cuda_abs_u8(sobel_y.apply(gray_gpu))
+        
+        if direction == "X only":
+            return abs_grad_x.download()
+        elif direction == "Y only":
+            return abs_grad_y.download()
+        else: # X and Y (Combined)
+            return cv2.cuda.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0).download()
+        
+    elif algorithm == "Laplacian":
+        ksize = params['ksize']
+        
+        # cv2.cuda only implements the 1x1 and 3x3 Laplacian apertures
+        if ksize > 3:
+            return None
+        
+        # The CUDA Laplacian only supports dstType == srcType, so it runs on a
+        # float copy to keep the sign and range; convertTo rounds and
+        # saturates like cv2.convertScaleAbs
+        gray_gpu_f32 = gray_gpu.convertTo(cv2.CV_32F)
+        laplacian = cv2.cuda.createLaplacianFilter(cv2.CV_32FC1, cv2.CV_32FC1, ksize=ksize)
+        return cv2.cuda.abs(laplacian.apply(gray_gpu_f32)).convertTo(cv2.CV_8U).download()
+        
+    return None
+
+def process_image(image, algorithm, params, image_key):
     # All algorithms operate on grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = get_gray(image_key, image)
     processed_image = gray 
 
+    # An explicit choice of the Numba CPU kernel takes precedence over the GPU
+    if CUDA_AVAILABLE and params['cpu_kernel'] != "Numba":
+        # Upload each grayscale source (preview / full resolution) to the GPU
+        # once per upload; later reruns only refilter it
+        gray_gpu = st.session_state['gray_gpu'].get(image_key)
+        if gray_gpu is None:
+            gray_gpu = cv2.cuda_GpuMat()
+            gray_gpu.upload(gray)
+            st.session_state['gray_gpu'][image_key] = gray_gpu
+        
+        processed_image = process_image_cuda(gray_gpu, algorithm, params)
+        if processed_image is not None:
+            return processed_image
+
     if algorithm == "Canny":
         sigma = params['sigma']
+        l2_gradient = params['l2_gradient']
         
-        if sigma > 0.0:
-            ksize_gauss = int(sigma * 4 + 1)
-            if ksize_gauss % 2 == 0: ksize_gauss += 1
-            if ksize_gauss < 3: ksize_gauss = 3
+        if not l2_gradient:
+            ksize_gauss = gaussian_ksize(sigma)
             
-            blurred = cv2.GaussianBlur(gray, (ksize_gauss, ksize_gauss), sigma)
+            blurred = blur_gray(image_key, gray, sigma, ksize_gauss)
         else:
             blurred = gray
 
-        processed_image = cv2.Canny(
-            blurred, 
-            params['minVal'], 
-            params['maxVal'], 
-            apertureSize=params['aperture_size']
-        )
+        # The Numba kernel always uses the L1 gradient magnitude
+        if NUMBA_CANNY_AVAILABLE and params['cpu_kernel'] == "Numba":
+            processed_image = canny_nb(blurred, params['minVal'], params['maxVal'], params['aperture_size'])
+        else:
+            processed_image = cv2.Canny(
+                blurred, 
+                params['minVal'], 
+                params['maxVal'], 
+                edges=get_scratch(gray.shape, np.uint8, 'out'),
+                apertureSize=params['aperture_size'],
+                L2gradient=l2_gradient
+            )
         
     elif algorithm == "Sobel":
         ksize = params['ksize']
         direction = params['direction']
         
         ddepth = cv2.CV_16S 
+        grad_x = get_scratch(gray.shape, np.int16, 'grad_x')
+        grad_y = get_scratch(gray.shape, np.int16, 'grad_y')
+        out = get_scratch(gray.shape, np.uint8, 'out')
         
-        grad_x = cv2.Sobel(gray, ddepth, 1, 0, ksize=ksize)
-        grad_y = cv2.Sobel(gray, ddepth, 0, 1, ksize=ksize)
-        
-        abs_grad_x = cv2.convertScaleAbs(grad_x)
-        abs_grad_y = cv2.convertScaleAbs(grad_y)
-        
+        # Only the gradients that are displayed are computed
         if direction == "X only":
-            processed_image = abs_grad_x
+            processed_image = abs_u8(sobel(gray, ddepth, 1, 0, ksize, dst=grad_x), params, out)
         elif direction == "Y only":
-            processed_image = abs_grad_y
+            processed_image = abs_u8(sobel(gray, ddepth, 0, 1, ksize, dst=grad_y), params, out)
         else: # X and Y (Combined)
-            processed_image = cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0)
+            # Averaging the signed gradients first would cancel diagonal edges
+            # where gx and gy have opposite signs, so the absolute values are
+            # kept and the average is written back into the X buffer.
+            abs_grad_x = abs_u8(sobel(gray, ddepth, 1, 0, ksize, dst=grad_x), params, out)
+            abs_grad_y = abs_u8(sobel(gray, ddepth, 0, 1, ksize, dst=grad_y), params, get_scratch(gray.shape, np.uint8, 'abs_grad_y'))
+            processed_image = cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0, dst=abs_grad_x)
         
     elif algorithm == "Laplacian":
         ksize = params['ksize']
         
-        ddepth = cv2.CV_16S 
+        # Same working depth as cv2.Laplacian: 16-bit up to ksize 5, float for 7
+        ddepth, wtype = (cv2.CV_16S, np.int16) if ksize <= 5 else (cv2.CV_32F, np.float32)
+        d2x = sobel(gray, ddepth, 2, 0, ksize, dst=get_scratch(gray.shape, wtype, 'grad_x'))
+        d2y = sobel(gray, ddepth, 0, 2, ksize, dst=get_scratch(gray.shape, wtype, 'grad_y'))
         
-        laplacian = cv2.Laplacian(gray, ddepth, ksize=ksize)
-        processed_image = cv2.convertScaleAbs(laplacian)
+        # d2/dx2 + d2/dy2; with ksize=1 these reduce to the 3x3 Laplacian aperture
+        laplacian = cv2.add(d2x, d2y, dst=d2x)
+        processed_image = abs_u8(laplacian, params, get_scratch(gray.shape, np.uint8, 'out'))
         
     return processed_image
 
 
+# Longest side of the image processed while parameters are being tuned
+PREVIEW_MAX_SIDE = 1024
+
+def make_preview(image):
+    # Downsample so the longest side is at most PREVIEW_MAX_SIDE pixels
+    scale = min(1.0, PREVIEW_MAX_SIDE / max(image.shape[:2]))
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+# Uploads are decoded at a reduced size, but never below this longest side
+DECODE_MIN_SIDE = 2048
+JPEG_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def reduction_factor(max_side):
+    # Largest of 8/4/2 that keeps the longest side >= DECODE_MIN_SIDE, else 1
+    for factor in (8, 4, 2):
+        if max_side // factor >= DECODE_MIN_SIDE:
+            return factor
+    return 1
+
+def decode_image(file_bytes):
+    # Returns the decoded BGR image and its scale relative to the file's pixels,
+    # or (None, 1.0) if the bytes cannot be decoded.
+    # JPEG is downscaled for free during the IDCT; other formats are decoded
+    # at full size and resized.
+    if file_bytes.size == 0:
+        # cv2.imdecode raises on an empty buffer instead of returning None
+        return None, 1.0
+    if file_bytes[:2].tobytes() == b'\xff\xd8':
+        # A 1/8 decode is cheap and gives the full dimensions (to within 8 px)
+        probe = cv2.imdecode(file_bytes, cv2.IMREAD_REDUCED_COLOR_8)
+        if probe is None:
+            return None, 1.0
+        factor = reduction_factor(max(probe.shape[:2]) * 8)
+        if factor == 8:
+            return probe, 1.0 / factor
+        flag = JPEG_REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)
+        return cv2.imdecode(file_bytes, flag), 1.0 / factor
+    
+    image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    if image is None:
+        return None, 1.0
+    factor = reduction_factor(max(image.shape[:2]))
+    if factor > 1:
+        image = cv2.resize(image, (0, 0), fx=1.0 / factor, fy=1.0 / factor, interpolation=cv2.INTER_AREA)
+    return image, 1.0 / factor
+
+def content_key(file_bytes):
+    # Cache key derived from the uploaded bytes, so that different files with
+    # the same name never share cached results (the caches are server-wide)
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+# Every (image, algorithm, params) combination already seen is served from the
+# cache, so returning to earlier slider values does not reprocess the image.
+# Only the PNG bytes handed to st.image are cached (st.image would otherwise
+# re-encode the array on every rerun); compression level 1 is several times
+# faster than the default and barely larger for edge maps. The decoded images
+# live in this session's st.session_state['images'], keyed by content, so the
+# pixel data itself is never hashed.
+@st.cache_data(max_entries=32)
+def _encode_png_cached(image_key, algorithm, params_tuple):
+    image = st.session_state['images'][image_key]
+    processed_image = process_image(image, algorithm, dict(params_tuple), image_key)
+    _, png = cv2.imencode('.png', processed_image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    return png.tobytes()
+
+
 # --- 3. UI Layout and Control Logic ---
 
 def reset_params_to_defaults():
     # List of all parameter keys used in the widgets
     param_keys = [
         'algorithm_select', # Also reset the algorithm selector
-        'canny_sigma', 'canny_minval', 'canny_maxval', 'canny_aperture',
-        'sobel_direction', 'sobel_ksize',
-        'laplacian_ksize'
+        'canny_sigma', 'canny_minval', 'canny_maxval', 'canny_aperture', 'canny_cpu_kernel',
+        'sobel_direction', 'sobel_ksize', 'sobel_cpu_kernel',
+        'laplacian_ksize', 'laplacian_cpu_kernel'
     ]
     
-    # Delete all parameter keys from session state
+    # Delete all parameter keys from session state; the rerun that follows
+    # this callback re-initializes the widgets with their default values
     for key in param_keys:
         if key in st.session_state:
             del st.session_state[key]
     
-    # Rerun the app to force widgets to re-initialize with their default values
-    st.rerun()
+    # Skip processing the defaults until the user's next action
+    st.session_state['skip_process'] = True
 
 
 def edge_detection_ui():
@@ -151,14 +401,19 @@ def edge_detection_ui():
     
     st.sidebar.subheader(f"{algorithm} Parameters")
     
-    # Dynamically display parameters based on the selected algorithm
+    # Dynamically display parameters based on the selected algorithm.
+    # The widgets sit in a form so dragging a slider does not rerun the
+    # script; the new values are only applied when "Apply" is pressed.
     params = {}
-    if algorithm == "Canny":
-        params = get_canny_params()
-    elif algorithm == "Sobel":
-        params = get_sobel_params()
-    elif algorithm == "Laplacian":
-        params = get_laplacian_params()
+    with st.sidebar.form("params", clear_on_submit=False):
+        if algorithm == "Canny":
+            params = get_canny_params()
+        elif algorithm == "Sobel":
+            params = get_sobel_params()
+        elif algorithm == "Laplacian":
+            params = get_laplacian_params()
+        
+        st.form_submit_button("Apply")
 
     
     # --- Reset button at the bottom of the sidebar ---
@@ -166,40 +421,80 @@ def edge_detection_ui():
     st.sidebar.button("Reset Parameters", on_click=reset_params_to_defaults, help="Resets all algorithm parameters to their starting default values.")
     st.sidebar.markdown("---")
     
+    # A reset only skips processing on the run straight after it, so the flag
+    # is consumed on every run, with or without an image
+    skip_process = st.session_state.pop('skip_process', False)
+    
     # Check if an image is uploaded
     if st.session_state['original_image'] is not None:
-        original_image = st.session_state['original_image']
-        
-        original_image_rgb = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
-        
-        # Process the image
-        processed_image = process_image(original_image, algorithm, params)
-        
-        # The UI must consist of two primary displays: Input and Output side-by-side.
-        col1, col2 = st.columns(2)
-        
-        # --- Display Input ---
-        with col1:
-            # Centered title for Input
-            st.markdown("<h2 style='text-align: center;'>Input</h2>", unsafe_allow_html=True) 
-            st.image(original_image_rgb, caption='Original Image', use_container_width=True) 
-            
-        # --- Display Output ---
-        with col2:
-            # Centered title for Output
-            st.markdown("<h2 style='text-align: center;'>Output</h2>", unsafe_allow_html=True) 
-            
-            # Convert 1-channel edge map to 3-channel BGR, then to RGB for Streamlit display
-            processed_image_bgr = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
-            processed_image_rgb = cv2.cvtColor(processed_image_bgr, cv2.COLOR_BGR2RGB)
-            
-            st.image(processed_image_rgb, caption=f'{algorithm} Edge Map', use_container_width=True) 
+        if skip_process:
+            st.info("Parameters were reset to their defaults. Press **Apply** to process the image.")
+        else:
+            render_output(st.session_state['original_image'], algorithm, params)
             
     else:
         # File uploader section will be displayed here by the main function
         pass
 
 
+def request_full_res(image_key, algorithm, params_tuple):
+    # Stay at full resolution until the image or the parameters change
+    st.session_state['full_res_params'] = (image_key, algorithm, params_tuple)
+
+
+# Widgets inside this fragment (the full resolution button) only rerun the
+# Input/Output panel, not the uploader, headers and sidebar
+@st.fragment
+def render_output(original_image, algorithm, params):
+    image_key = st.session_state['image_key']
+    preview_key = f"{image_key}:preview"
+    
+    params_tuple = tuple(sorted(params.items()))
+    full_res = st.session_state.get('full_res_params') == (image_key, algorithm, params_tuple)
+    is_preview = not full_res and st.session_state['preview_image'].shape != original_image.shape
+    
+    # Keep the Canny blur proportional to the original file's pixels when
+    # the processed image was reduced on decode and/or for the preview. Whether
+    # to skip the blur (and use the L2 gradient) follows the user's unscaled
+    # sigma, so the preview and the full resolution render agree.
+    process_params_tuple = params_tuple
+    if algorithm == "Canny":
+        scale = st.session_state['decode_scale']
+        if not full_res:
+            scale *= st.session_state['preview_image'].shape[1] / original_image.shape[1]
+        process_params = dict(
+            params,
+            sigma=round(params['sigma'] * scale, 3),
+            l2_gradient=params['sigma'] <= CANNY_PREBLUR_MIN_SIGMA
+        )
+        process_params_tuple = tuple(sorted(process_params.items()))
+    
+    # Process the image and encode it for display (memoized on image, algorithm and parameters)
+    processed_png = _encode_png_cached(image_key if full_res else preview_key, algorithm, process_params_tuple)
+    
+    # The UI must consist of two primary displays: Input and Output side-by-side.
+    col1, col2 = st.columns(2)
+    
+    # --- Display Input ---
+    with col1:
+        # Centered title for Input
+        st.markdown("<h2 style='text-align: center;'>Input</h2>", unsafe_allow_html=True) 
+        st.image(original_image, caption='Original Image', use_container_width=True) 
+        
+    # --- Display Output ---
+    with col2:
+        # Centered title for Output
+        st.markdown("<h2 style='text-align: center;'>Output</h2>", unsafe_allow_html=True) 
+        
+        # The 1-channel edge map is passed as already-encoded PNG bytes
+        caption = f'{algorithm} Edge Map (preview)' if is_preview else f'{algorithm} Edge Map'
+        st.image(processed_png, caption=caption, use_container_width=True) 
+        
+        # Reruns process a downsampled preview; this renders the current settings at full size
+        if is_preview:
+            st.button("Render full resolution", on_click=request_full_res, args=(image_key, algorithm, params_tuple), help="Processes the original image instead of the downsampled preview.")
+
+
 # --- 4. Application Entry Point ---
 
 def main():
@@ -212,20 +507,55 @@ def main():
     uploaded_file = st.file_uploader("Choose an image file...", type=["jpg", "jpeg", "png", "bmp"]) 
 
     if uploaded_file is not None:
-        if 'last_uploaded_name' not in st.session_state or st.session_state['last_uploaded_name'] != uploaded_file.name:
-            file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-            original_image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        if st.session_state['last_uploaded_id'] != uploaded_file.file_id:
+            # Zero-copy view of the upload; getvalue() does not consume the stream
+            file_bytes = np.frombuffer(uploaded_file.getvalue(), dtype=np.uint8)
+            original_image, decode_scale = decode_image(file_bytes)
+            
+            if original_image is None:
+                # Corrupt or mislabelled file: show an error instead of an image
+                st.session_state['original_image'] = None
+                st.error(f"Could not read '{uploaded_file.name}' as an image. Please upload a valid JPG, PNG or BMP file.")
+            else:
+                image_key = content_key(file_bytes)
+                # Swap to RGB in place and keep only that copy: it is displayed
+                # as-is and converted to grayscale for processing
+                cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB, dst=original_image)
 
-            st.session_state['original_image'] = original_image
-            st.session_state['last_uploaded_name'] = uploaded_file.name 
+                st.session_state['original_image'] = original_image
+                st.session_state['decode_scale'] = decode_scale
+                st.session_state['preview_image'] = make_preview(original_image)
+                st.session_state['images'] = {
+                    image_key: original_image,
+                    f"{image_key}:preview": st.session_state['preview_image'],
+                }
+                st.session_state['image_key'] = image_key
+                st.session_state['last_uploaded_id'] = uploaded_file.file_id
+                st.session_state['gray'] = {}
+                st.session_state['gray_gpu'] = {}
+                st.session_state['scratch'] = {}
 
     edge_detection_ui() 
     
 # Initialize session state for the image storage
 if 'original_image' not in st.session_state:
     st.session_state['original_image'] = None
-if 'last_uploaded_name' not in st.session_state:
-    st.session_state['last_uploaded_name'] = None
+if 'last_uploaded_id' not in st.session_state:
+    st.session_state['last_uploaded_id'] = None
+if 'image_key' not in st.session_state:
+    st.session_state['image_key'] = None
+if 'images' not in st.session_state:
+    st.session_state['images'] = {}
+if 'decode_scale' not in st.session_state:
+    st.session_state['decode_scale'] = 1.0
+if 'preview_image' not in st.session_state:
+    st.session_state['preview_image'] = None
+if 'gray' not in st.session_state:
+    st.session_state['gray'] = {}
+if 'gray_gpu' not in st.session_state:
+    st.session_state['gray_gpu'] = {}
+if 'scratch' not in st.session_state:
+    st.session_state['scratch'] = {}
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
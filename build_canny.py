@@ -0,0 +1,29 @@
+"""Ahead-of-time build of the Numba Canny kernel.
+
+Run once at install time, from the project directory:
+
+    python build_canny.py
+
+This writes a compiled ``canny_aot`` extension module next to app.py. The
+module does not need Numba at runtime, so deployments that only install
+Numba at build time still get the Numba Canny kernel. When Numba is
+installed, app.py uses the parallel JIT kernel from canny_numba.py instead
+(its compiled code is cached on disk after the first run).
+
+The extension is a snapshot of canny_numba.py: rebuild it after editing that
+file.
+"""
+import os
+
+from numba.pycc import CC
+
+from canny_numba import canny_nb
+
+cc = CC('canny_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# prange runs as a plain range in AOT builds, so this export is single-threaded
+cc.export('canny', 'u1[:,:](u1[:,:], i4, i4, i4)')(canny_nb.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -0,0 +1,168 @@
+"""Numba implementation of the Canny edge detector.
+
+Selectable from the sidebar as an alternative CPU kernel to cv2.Canny. It
+follows the same steps as OpenCV: Sobel gradients, L1 gradient magnitude,
+non-maximum suppression along four quantized directions, double threshold
+and hysteresis.
+
+Also holds the lookup-table absolute value used in place of
+cv2.convertScaleAbs for the Sobel and Laplacian gradients when the Numba
+kernel is selected.
+"""
+import numpy as np
+from numba import njit, prange
+
+# tan(22.5 deg) in Q15 fixed point, used (as in OpenCV) to bin the gradient
+# direction with integer compares instead of arctan
+TG22 = 13573
+
+NO_EDGE = 0
+WEAK_EDGE = 1
+STRONG_EDGE = 2
+
+
+@njit(cache=True)
+def _sobel_kernels(ap):
+    # Smoothing kernel: binomial coefficients of order ap - 1, e.g. [1, 2, 1]
+    smooth = np.zeros(ap, np.int32)
+    smooth[0] = 1
+    for i in range(1, ap):
+        for j in range(i, 0, -1):
+            smooth[j] += smooth[j - 1]
+
+    # Derivative kernel: binomial of order ap - 3 convolved with [-1, 0, 1]
+    base = np.zeros(ap - 2, np.int32)
+    base[0] = 1
+    for i in range(1, ap - 2):
+        for j in range(i, 0, -1):
+            base[j] += base[j - 1]
+
+    deriv = np.zeros(ap, np.int32)
+    for j in range(ap - 2):
+        deriv[j] -= base[j]
+        deriv[j + 2] += base[j]
+
+    return smooth, deriv
+
+
+@njit(cache=True)
+def _has_strong_neighbour(state, i, j, h, w):
+    for y in range(max(i - 1, 0), min(i + 2, h)):
+        for x in range(max(j - 1, 0), min(j + 2, w)):
+            if state[y, x] == STRONG_EDGE:
+                return True
+    return False
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def canny_nb(gray, lo, hi, ap):
+    h, w = gray.shape
+    r = ap // 2
+    smooth, deriv = _sobel_kernels(ap)
+    if lo > hi:
+        lo, hi = hi, lo
+
+    # Sobel, horizontal pass (replicated border, like cv2.Canny)
+    dx_row = np.empty((h, w), np.int32)
+    sx_row = np.empty((h, w), np.int32)
+    for i in prange(h):
+        for j in range(w):
+            d = 0
+            s = 0
+            for t in range(ap):
+                v = np.int32(gray[i, min(max(j + t - r, 0), w - 1)])
+                d += deriv[t] * v
+                s += smooth[t] * v
+            dx_row[i, j] = d
+            sx_row[i, j] = s
+
+    # Sobel, vertical pass, and L1 magnitude. int32 rather than int16 so the
+    # 7x7 aperture does not overflow.
+    gx = np.empty((h, w), np.int32)
+    gy = np.empty((h, w), np.int32)
+    mag = np.empty((h, w), np.int32)
+    for i in prange(h):
+        for j in range(w):
+            a = 0
+            b = 0
+            for t in range(ap):
+                y = min(max(i + t - r, 0), h - 1)
+                a += smooth[t] * dx_row[y, j]
+                b += deriv[t] * sx_row[y, j]
+            gx[i, j] = a
+            gy[i, j] = b
+            mag[i, j] = abs(a) + abs(b)
+
+    # Non-maximum suppression and double threshold
+    state = np.zeros((h, w), np.uint8)
+    for i in prange(h):
+        for j in range(w):
+            m = mag[i, j]
+            if m <= lo:
+                continue
+
+            xs = np.int64(gx[i, j])
+            ys = np.int64(gy[i, j])
+            x = abs(xs)
+            y = abs(ys) << 15
+            tg22x = x * TG22
+
+            if y < tg22x:
+                # Horizontal gradient: compare left/right
+                n1 = mag[i, j - 1] if j > 0 else 0
+                n2 = mag[i, j + 1] if j < w - 1 else 0
+                keep = m > n1 and m >= n2
+            elif y > tg22x + (x << 16):
+                # Vertical gradient: compare top/bottom
+                n1 = mag[i - 1, j] if i > 0 else 0
+                n2 = mag[i + 1, j] if i < h - 1 else 0
+                keep = m > n1 and m >= n2
+            else:
+                # Diagonal gradient: the sign of gx * gy picks the diagonal
+                s = -1 if (xs ^ ys) < 0 else 1
+                n1 = mag[i - 1, j - s] if i > 0 and 0 <= j - s < w else 0
+                n2 = mag[i + 1, j + s] if i < h - 1 and 0 <= j + s < w else 0
+                keep = m > n1 and m > n2
+
+            if keep:
+                state[i, j] = STRONG_EDGE if m > hi else WEAK_EDGE
+
+    # Hysteresis: promote weak pixels touching a strong one, sweeping forwards
+    # and backwards until nothing changes (no recursion or explicit stack)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(h):
+            for j in range(w):
+                if state[i, j] == WEAK_EDGE and _has_strong_neighbour(state, i, j, h, w):
+                    state[i, j] = STRONG_EDGE
+                    changed = True
+        for i in range(h - 1, -1, -1):
+            for j in range(w - 1, -1, -1):
+                if state[i, j] == WEAK_EDGE and _has_strong_neighbour(state, i, j, h, w):
+                    state[i, j] = STRONG_EDGE
+                    changed = True
+
+    edges = np.empty((h, w), np.uint8)
+    for i in prange(h):
+        for j in range(w):
+            edges[i, j] = 255 if state[i, j] == STRONG_EDGE else 0
+
+    return edges
+
+
+# |x| saturated to uint8 for every int16 value, indexed by x + ABS_LUT_OFFSET.
+# Covers the full CV_16S range, so it is valid for every Sobel/Laplacian ksize.
+ABS_LUT_OFFSET = 32768
+ABS_LUT = np.clip(np.abs(np.arange(-ABS_LUT_OFFSET, ABS_LUT_OFFSET, dtype=np.int32)), 0, 255).astype(np.uint8)
+
+
+@njit(parallel=True, cache=True)
+def lut_abs(grad, lut, out):
+    # Branchless abs + clamp + cast: one table gather per pixel. Both arrays
+    # must be C-contiguous and of the same shape.
+    g = grad.reshape(-1)
+    o = out.reshape(-1)
+    for i in prange(g.size):
+        o[i] = lut[np.int32(g[i]) + ABS_LUT_OFFSET]
+    return out